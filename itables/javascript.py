@@ -6,6 +6,9 @@ import re
 import uuid
 import warnings
 from base64 import b64encode
+from functools import lru_cache
+from html import escape
+from itertools import chain
 
 import numpy as np
 import pandas as pd
@@ -35,6 +38,11 @@ try:
 except ImportError:
     GOOGLE_COLAB = False
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 def init_notebook_mode(
     all_interactive=False, connected=GOOGLE_COLAB, warn_if_call_is_superfluous=True
@@ -69,8 +77,8 @@ def init_notebook_mode(
     _CONNECTED = connected
 
     if all_interactive:
-        pd.DataFrame._repr_html_ = _datatables_repr_
-        pd.Series._repr_html_ = _datatables_repr_
+        pd.DataFrame._repr_html_ = _interactive_repr_html_
+        pd.Series._repr_html_ = _interactive_repr_html_
     else:
         pd.DataFrame._repr_html_ = _ORIGINAL_DATAFRAME_REPR_HTML
         if hasattr(pd.Series, "_repr_html_"):
@@ -101,26 +109,121 @@ def init_notebook_mode(
         )
 
 
-def _formatted_values(df):
-    """Return the table content as a list of lists for DataTables"""
-    formatted_df = df.copy()
-    for col in formatted_df:
-        x = formatted_df[col]
+# Applies str to each element of an object array, and returns an object array
+_str_ufunc = np.frompyfunc(str, 1, 1)
+
+
+def _formatted_values(df, extra_leading_columns=(), float_precision=None):
+    """Return the table content as a list of (numpy) columns.
+    The extra leading columns (e.g. the index levels) come first"""
+    columns = []
+    for x in chain(extra_leading_columns, (x for _, x in df.items())):
         if x.dtype.kind in ["b", "i", "s"]:
+            # pd.NA in the nullable Int64 or boolean columns is exported as null
+            columns.append(
+                x.to_numpy(dtype=object, na_value=None) if x.hasnans else x.to_numpy()
+            )
             continue
 
         if x.dtype.kind == "O":
-            formatted_df[col] = formatted_df[col].astype(str)
+            # Object columns of strings don't need to be converted. Note that
+            # infer_dtype returns "string" for the StringDtype columns with pd.NA
+            if (
+                x.dtype == object
+                and pd.api.types.infer_dtype(x, skipna=False) == "string"
+            ):
+                columns.append(x.to_numpy())
+            else:
+                columns.append(_str_ufunc(x.to_numpy()))
             continue
 
-        formatted_df[col] = np.array(fmt.format_array(x.values, None))
+        if x.dtype.kind == "f" and pd.get_option("display.float_format") is None:
+            # Floats don't need to go through the pandas formatter
+            if x.dtype.itemsize < 8:
+                # float32(0.1) is 0.10000000149011612 in float64, so we go
+                # through the shortest representation of the float32 values
+                column = x.to_numpy(dtype=f"f{x.dtype.itemsize}", na_value=np.nan)
+                column = column.astype(str).astype(np.float64)
+            else:
+                column = x.to_numpy(dtype=np.float64, na_value=np.nan)
+            finite = np.isfinite(column)
+            if finite.all():
+                columns.append(_shortened_floats(column, float_precision))
+            else:
+                # The non-finite values are exported by _non_finite_values
+                shortened = column.copy()
+                shortened[finite] = _shortened_floats(column[finite], float_precision)
+                columns.append(shortened)
+            continue
+
+        column = np.array(fmt.format_array(x.values, None))
         if x.dtype.kind == "f":
             try:
-                formatted_df[col] = formatted_df[col].astype(float)
+                column = column.astype(float)
             except ValueError:
                 pass
+        columns.append(column)
+
+    return columns
 
-    return formatted_df.values.tolist()
+
+def _non_finite_values(columns):
+    """Return the rows of the NaN and infinite values in the float columns, as
+    {column: {"NaN": rows, "Infinity": rows, "-Infinity": rows}}.
+    These values are exported as null in the table data, and restored in JS,
+    so that the float columns remain numeric in DataTables"""
+    non_finite = {}
+    for i, column in enumerate(columns):
+        if column.dtype.kind != "f" or np.isfinite(column).all():
+            continue
+        non_finite[str(i)] = {
+            value: np.flatnonzero(rows).tolist()
+            for value, rows in [
+                ("NaN", np.isnan(column)),
+                ("Infinity", column == np.inf),
+                ("-Infinity", column == -np.inf),
+            ]
+            if rows.any()
+        }
+    return non_finite
+
+
+def _shortened_floats(x, precision):
+    """Return an array of finite floats that is shorter to export:
+    integers if the floats are integral, otherwise floats rounded to 'precision'
+    decimals (or significant digits for the numbers that would round to zero)"""
+    x = np.asarray(x, dtype=np.float64)
+    if (np.abs(x) < 2**53).all() and (x == np.trunc(x)).all():
+        return x.astype(np.int64)
+
+    if precision is None:
+        return x
+
+    # Like pandas, we round to 'precision' decimals, except for the numbers
+    # that would become zero, which are rounded to significant digits instead
+    exponent = np.floor(np.log10(np.abs(np.where(x == 0, 1.0, x))))
+    small = (x != 0) & (np.round(x, precision) == 0)
+    decimals = np.where(small, max(precision, 1) - 1 - exponent, precision)
+
+    # Powers of ten are exact only up to 1e22. The numbers that need more
+    # decimals are kept as is, and so are the numbers above 2**52, which
+    # have no fractional part
+    scale = 10.0 ** np.minimum(decimals, 22)
+    with np.errstate(over="ignore", invalid="ignore"):
+        scaled = x * scale
+        rounded = np.round(scaled) / scale
+    return np.where((decimals <= 22) & (np.abs(scaled) < 2**52), rounded, x)
+
+
+def _needs_downsample(df, max_rows, max_columns, max_bytes):
+    """Can the table be larger than the limits? We don't compute the size in bytes
+    here, as df.values is a copy of the data when the columns have different types,
+    and downsample computes it anyway"""
+    return (
+        len(df.index) > max_rows > 0
+        or len(df.columns) > max_columns > 0
+        or max_bytes > 0
+    )
 
 
 def _table_header(
@@ -129,20 +232,21 @@ def _table_header(
     """This function returns the HTML table header. Rows are not included."""
     # Generate table head using pandas.to_html(), see issue 63
     pattern = re.compile(r".*<thead>(.*)</thead>", flags=re.MULTILINE | re.DOTALL)
-    match = pattern.match(df.head(0).to_html())
+    header_df = df.head(0)
+    if not show_index:
+        header_df = header_df.reset_index(drop=True)
+    match = pattern.match(header_df.to_html())
     thead = match.groups()[0]
     if not show_index:
         thead = thead.replace("<th></th>", "", 1)
 
     if column_filters:
         # We use this header in the column filters, so we need to remove any column multiindex first"""
-        thead_flat = ""
-        if show_index:
-            for index in df.index.names:
-                thead_flat += f"<th>{index}</th>"
-
-        for column in df.columns:
-            thead_flat += f"<th>{column}</th>"
+        names = list(df.index.names) if show_index else []
+        names.extend(df.columns)
+        thead_flat = "".join(
+            f"<th>{escape(str(name), quote=False)}</th>" for name in names
+        )
 
     loading = "<td>Loading... (need <a href=https://mwouts.github.io/itables/troubleshooting.html>help</a>?)</td>"
     tbody = f"<tr>{loading}</tr>"
@@ -173,31 +277,83 @@ def json_dumps(obj, eval_functions):
     does not quote strings that start with 'function', so that
     these functions are evaluated in the HTML code.
     """
-    if isinstance(obj, JavascriptFunction):
-        assert obj.lstrip().startswith("function")
-        return obj
-    if isinstance(obj, str) and obj.lstrip().startswith("function"):
-        if eval_functions is True:
-            return obj
-        if eval_functions is None and obj.lstrip().startswith("function"):
-            warnings.warn(
-                "One of the arguments passed to datatables starts with 'function'. "
-                "To evaluate this function, change it into a 'JavascriptFunction' object "
-                "or use the option 'eval_functions=True'. "
-                "To silence this warning, use 'eval_functions=False'."
-            )
-    if isinstance(obj, list):
-        return "[" + ", ".join(json_dumps(i, eval_functions) for i in obj) + "]"
-    if isinstance(obj, dict):
-        return (
-            "{"
-            + ", ".join(
-                f'"{key}": {json_dumps(value, eval_functions)}'
-                for key, value in obj.items()
-            )
-            + "}"
+    text, has_unevaluated_functions = _json_dumps(obj, eval_functions)
+    if eval_functions is None and has_unevaluated_functions:
+        warnings.warn(
+            "One of the arguments passed to datatables starts with 'function'. "
+            "To evaluate this function, change it into a 'JavascriptFunction' object "
+            "or use the option 'eval_functions=True'. "
+            "To silence this warning, use 'eval_functions=False'."
+        )
+    return text
+
+
+def _json_dumps(obj, eval_functions):
+    """Implementation of json_dumps. The nested objects are visited
+    with a stack rather than recursively. Returns the JSON text, and whether
+    a string that starts with 'function' was left unevaluated"""
+    chunks = []
+    has_unevaluated_functions = False
+    # The stack contains (is_text, obj) pairs, where text is output as is
+    stack = [(False, obj)]
+    while stack:
+        is_text, obj = stack.pop()
+        if is_text:
+            chunks.append(obj)
+        elif isinstance(obj, JavascriptFunction):
+            assert obj.lstrip().startswith("function")
+            chunks.append(obj)
+        elif isinstance(obj, str) and obj.lstrip().startswith("function"):
+            if eval_functions is True:
+                chunks.append(obj)
+            else:
+                has_unevaluated_functions = True
+                chunks.append(json.dumps(obj))
+        elif isinstance(obj, list):
+            # The items are pushed in reverse order
+            stack.append((True, "]"))
+            for i, value in enumerate(reversed(obj)):
+                if i:
+                    stack.append((True, ", "))
+                stack.append((False, value))
+            stack.append((True, "["))
+        elif isinstance(obj, dict):
+            stack.append((True, "}"))
+            for i, (key, value) in enumerate(reversed(list(obj.items()))):
+                if i:
+                    stack.append((True, ", "))
+                stack.append((False, value))
+                stack.append((True, f'"{key}": '))
+            stack.append((True, "{"))
+        else:
+            chunks.append(json.dumps(obj))
+
+    return "".join(chunks), has_unevaluated_functions
+
+
+def _table_data_dumps(columns):
+    """Export the table columns to JSON. We use orjson when it is available,
+    as it is much faster than json on large tables"""
+    if orjson is None:
+        # Like orjson, we export the non-finite floats as null
+        return json.dumps(
+            [
+                np.where(np.isfinite(column), column, None).tolist()
+                if column.dtype.kind == "f"
+                else column.tolist()
+                for column in columns
+            ]
         )
-    return json.dumps(obj)
+    return orjson.dumps(
+        columns, default=_orjson_default, option=orjson.OPT_SERIALIZE_NUMPY
+    ).decode()
+
+
+def _orjson_default(obj):
+    """orjson does not serialize the numpy arrays of objects"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    return str(obj)
 
 
 def replace_value(template, pattern, value):
@@ -208,22 +364,43 @@ def replace_value(template, pattern, value):
     return template.replace(pattern, value)
 
 
+def render_template(template, values):
+    """Replace each pattern (the keys in values) with its value in the template.
+    The template is split on the patterns only once, and the result is
+    assembled in a single join"""
+    segments = _split_template(template, tuple(values))
+    # The patterns are at the odd positions
+    return "".join(
+        values[segment] if i % 2 else segment for i, segment in enumerate(segments)
+    )
+
+
+@lru_cache(maxsize=32)
+def _split_template(template, patterns):
+    """Split the template on the given patterns, and keep the patterns"""
+    for pattern in patterns:
+        assert pattern in template, pattern
+    return tuple(re.split("(" + "|".join(map(re.escape, patterns)) + ")", template))
+
+
 class JavascriptFunction(str):
     """A class that explicitly states that a string is a Javascript function"""
 
     def __init__(self, value):
-        assert value.lstrip().startswith(
-            "function"
-        ), "A Javascript function is expected to start with 'function'"
+        if not value.lstrip().startswith("function"):
+            raise ValueError(
+                "A Javascript function is expected to start with 'function'"
+            )
 
 
 def _datatables_repr_(df=None, tableId=None, **kwargs):
     """Return the HTML/javascript representation of the table"""
 
-    # Default options
-    for option in dir(opt):
-        if option not in kwargs and not option.startswith("__"):
-            kwargs[option] = getattr(opt, option)
+    # Default options. We read them at every call as users can change
+    # or add options in itables.options at any time
+    for option, value in vars(opt).items():
+        if not option.startswith("__"):
+            kwargs.setdefault(option, value)
 
     # These options are used here, not in DataTable
     classes = kwargs.pop("classes")
@@ -236,6 +413,10 @@ def _datatables_repr_(df=None, tableId=None, **kwargs):
     maxColumns = kwargs.pop("maxColumns", pd.get_option("display.max_columns") or 0)
     eval_functions = kwargs.pop("eval_functions", None)
     pre_dt_code = kwargs.pop("pre_dt_code")
+    float_precision = kwargs.pop("float_precision", None)
+    if float_precision is None:
+        float_precision = pd.get_option("display.precision")
+    kwargs.pop("interactiveMinRows")
 
     if isinstance(df, (np.ndarray, np.generic)):
         df = pd.DataFrame(df)
@@ -243,7 +424,10 @@ def _datatables_repr_(df=None, tableId=None, **kwargs):
     if isinstance(df, pd.Series):
         df = df.to_frame()
 
-    df = downsample(df, max_rows=maxRows, max_columns=maxColumns, max_bytes=maxBytes)
+    if _needs_downsample(df, maxRows, maxColumns, maxBytes):
+        df = downsample(
+            df, max_rows=maxRows, max_columns=maxColumns, max_bytes=maxBytes
+        )
 
     footer = kwargs.pop("footer")
     column_filters = kwargs.pop("column_filters")
@@ -261,44 +445,24 @@ def _datatables_repr_(df=None, tableId=None, **kwargs):
     if "paging" not in kwargs and len(df.index) <= kwargs.get("lengthMenu", [10])[0]:
         kwargs["paging"] = False
 
-    # Load the HTML template
-    if _CONNECTED:
-        output = read_package_file("html/datatables_template_connected.html")
-    else:
-        output = read_package_file("html/datatables_template.html")
-
-    tableId = tableId or str(uuid.uuid4())
+    tableId = tableId or uuid.uuid4().hex
     if isinstance(classes, list):
         classes = " ".join(classes)
 
     if showIndex == "auto":
         showIndex = df.index.name is not None or not isinstance(df.index, pd.RangeIndex)
 
-    if not showIndex:
-        df = df.set_index(pd.RangeIndex(len(df.index)))
-
     table_header = _table_header(
         df, tableId, showIndex, classes, style, tags, footer, column_filters
     )
-    output = replace_value(
-        output,
-        '<table id="table_id"><thead><tr><th>A</th></tr></thead></table>',
-        table_header,
-    )
-    output = replace_value(output, "#table_id", f"#{tableId}")
-    output = replace_value(
-        output,
-        "<style></style>",
-        f"""<style>
-{read_package_file("html/style.css")}
-</style>""",
-    )
 
     if column_filters:
         # If the below was false, we would need to concatenate the JS code
         # which might not be trivial...
-        assert pre_dt_code == ""
-        assert "initComplete" not in kwargs
+        if pre_dt_code != "":
+            raise ValueError("column_filters cannot be combined with pre_dt_code")
+        if "initComplete" in kwargs:
+            raise ValueError("column_filters cannot be combined with initComplete")
 
         pre_dt_code = replace_value(
             read_package_file("html/column_filters/pre_dt_code.js"),
@@ -320,17 +484,49 @@ def _datatables_repr_(df=None, tableId=None, **kwargs):
     # Export the DT args to JSON
     dt_args = json_dumps(kwargs, eval_functions)
 
-    output = replace_value(output, "let dt_args = {};", f"let dt_args = {dt_args};")
-    output = replace_value(
-        output, "// [pre-dt-code]", pre_dt_code.replace("#table_id", f"#{tableId}")
+    # Export the table data to JSON.
+    # The data is exported column by column, and the rows are built in JS
+    if showIndex:
+        index_levels = [df.index.get_level_values(i) for i in range(df.index.nlevels)]
+    else:
+        index_levels = []
+    columns = _formatted_values(
+        df, extra_leading_columns=index_levels, float_precision=float_precision
+    )
+    dt_columns = _table_data_dumps(columns)
+    non_finite = json.dumps(_non_finite_values(columns))
+
+    # Fill the HTML template
+    if _CONNECTED:
+        template = read_package_file("html/datatables_template_connected.html")
+    else:
+        template = read_package_file("html/datatables_template.html")
+
+    return render_template(
+        template,
+        {
+            '<table id="table_id"><thead><tr><th>A</th></tr></thead></table>': table_header,
+            "#table_id": f"#{tableId}",
+            "<style></style>": f"""<style>
+{read_package_file("html/style.css")}
+</style>""",
+            "let dt_args = {};": f"let dt_args = {dt_args};",
+            "// [pre-dt-code]": pre_dt_code.replace("#table_id", f"#{tableId}"),
+            "const columns = [];": f"const columns = {dt_columns};",
+            "const non_finite = {};": f"const non_finite = {non_finite};",
+        },
     )
 
-    # Export the table data to JSON and include this in the HTML
-    data = _formatted_values(df.reset_index() if showIndex else df)
-    dt_data = json.dumps(data)
-    output = replace_value(output, "const data = [];", f"const data = {dt_data};")
 
-    return output
+def _interactive_repr_html_(df):
+    """The HTML representation of the DataFrames and Series in the all_interactive mode.
+    Tables with fewer rows than opt.interactiveMinRows use the Pandas representation"""
+    if len(df.index) < opt.interactiveMinRows:
+        if isinstance(df, pd.DataFrame):
+            return _ORIGINAL_DATAFRAME_REPR_HTML(df)
+        # Series don't have an HTML representation
+        return None
+    return _datatables_repr_(df)
 
 
 def show(df=None, **kwargs):
@@ -20,6 +20,15 @@ maxBytes = 2**16
 # maxRows = 10000
 # maxColumns = 1000
 
+"""Floats are rounded to this number of decimals (or of significant digits, for the numbers
+that would round to zero) when pd.options.display.float_format is not set.
+When None, we use pd.options.display.precision"""
+float_precision = None
+
+"""In the all_interactive mode, the tables with fewer rows than this
+are displayed with the default Pandas representation"""
+interactiveMinRows = 1
+
 """Pre dt code"""
 pre_dt_code = ""
 
@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 
 
 def find_package_file(*path):
@@ -7,7 +8,9 @@ def find_package_file(*path):
     return os.path.join(current_path, *path)
 
 
+@lru_cache(maxsize=32)
 def read_package_file(*path):
-    """Return the content of a file from the itables package"""
+    """Return the content of a file from the itables package.
+    The files are read only once, as they don't change during the session"""
     with open(find_package_file(*path), encoding="utf-8") as fp:
         return fp.read()
@@ -50,6 +50,7 @@ setup(
     },
     tests_require=["pytest"],
     install_requires=["IPython", "pandas"],
+    extras_require={"orjson": ["orjson"]},
     license="MIT",
     classifiers=[
         "Development Status :: 4 - Beta",
@@ -4,6 +4,7 @@ import pandas as pd
 import pytest
 
 from itables.downsample import downsample, shrink_towards_target_aspect_ratio
+from itables.javascript import _needs_downsample
 
 
 def large_tables(N=1000, M=1000):
@@ -38,6 +39,21 @@ def test_max_bytes(df, max_bytes):
     assert dn.values.nbytes > max_bytes / 2
 
 
+@pytest.mark.parametrize("df", large_tables(N=100, M=10))
+def test_needs_downsample(df):
+    assert not _needs_downsample(df, 0, 0, 0)
+
+    assert _needs_downsample(df, 99, 0, 0)
+    assert not _needs_downsample(df, 100, 0, 0)
+
+    assert _needs_downsample(df, 0, 9, 0)
+    assert not _needs_downsample(df, 0, 10, 0)
+
+    # The byte limit is checked by downsample
+    assert _needs_downsample(df, 0, 0, df.values.nbytes)
+    assert _needs_downsample(df, 100, 10, 1)
+
+
 @pytest.mark.parametrize("df", large_tables())
 def test_max_one_byte(df, max_bytes=1):
     dn = downsample(df, max_bytes=max_bytes)
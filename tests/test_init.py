@@ -15,3 +15,15 @@ def test_init():
     # No pb if we do this twice
     init_notebook_mode(all_interactive=False)
     assert not hasattr(pd.Series, "_repr_html_")
+
+
+def test_empty_tables_use_the_pandas_representation():
+    init_notebook_mode(all_interactive=True, connected=True)
+    try:
+        assert pd.DataFrame(columns=["a"])._repr_html_().startswith("<div>")
+        assert pd.Series([], dtype=float)._repr_html_() is None
+        assert "<script" in pd.DataFrame({"a": [1]})._repr_html_()
+    finally:
+        init_notebook_mode(
+            all_interactive=False, connected=True, warn_if_call_is_superfluous=False
+        )
@@ -1,10 +1,137 @@
+import json
+
+import numpy as np
 import pandas as pd
+import pytest
 
 from itables import javascript
 
 
+@pytest.fixture(params=["orjson", "json"])
+def json_exporter(request, monkeypatch):
+    """Export the table data with orjson, or with the json fallback"""
+    if request.param == "json":
+        monkeypatch.setattr(javascript, "orjson", None)
+    return request.param
+
+
 def test_datatables_repr_max_columns_none():
     test_df = pd.DataFrame([1, 2])
     with pd.option_context("display.max_columns", None):
         html = javascript._datatables_repr_(test_df)
         assert html
+
+
+def test_table_data_dumps_is_valid_json():
+    columns = [
+        np.array([1, 2]),
+        np.array([2.5, -1.0]),
+        np.array(["a", 1], dtype=object),
+    ]
+    assert json.loads(javascript._table_data_dumps(columns)) == [
+        [1, 2],
+        [2.5, -1.0],
+        ["a", 1],
+    ]
+
+
+def test_formatted_values_floats():
+    df = pd.DataFrame({"finite": [1.5, -2.25], "nan": [1.5, float("nan")]})
+    finite, nan = javascript._formatted_values(df)
+    assert finite.tolist() == [1.5, -2.25]
+    assert nan[0] == 1.5
+    assert np.isnan(nan[1])
+
+
+def test_non_finite_floats_are_exported_as_null_and_restored_in_js(json_exporter):
+    df = pd.DataFrame({"a": [9.5, np.nan, np.inf, -np.inf], "b": ["x", "y", "z", "t"]})
+    html = javascript._datatables_repr_(df).replace(" ", "")
+    assert '[[9.5,null,null,null],["x","y","z","t"]]' in html
+    assert 'constnon_finite={"0":{"NaN":[1],"Infinity":[2],"-Infinity":[3]}};' in html
+
+
+def test_float32_are_exported_without_spurious_digits(json_exporter):
+    df = pd.DataFrame({"a": np.array([0.1, 0.2], dtype=np.float32)})
+    columns = javascript._formatted_values(df)
+    assert json.loads(javascript._table_data_dumps(columns)) == [[0.1, 0.2]]
+
+
+def test_string_dtype_with_missing_values(json_exporter):
+    df = pd.DataFrame({"a": pd.array(["x", None], dtype="string")})
+    columns = javascript._formatted_values(df)
+    assert json.loads(javascript._table_data_dumps(columns)) == [["x", "<NA>"]]
+
+
+def test_nullable_columns_with_missing_values(json_exporter):
+    df = pd.DataFrame(
+        {
+            "int": pd.array([1, None], dtype="Int64"),
+            "bool": pd.array([True, None], dtype="boolean"),
+        }
+    )
+    columns = javascript._formatted_values(df)
+    assert json.loads(javascript._table_data_dumps(columns)) == [
+        [1, None],
+        [True, None],
+    ]
+
+
+def test_render_template():
+    assert (
+        javascript.render_template("#a b #a c", {"#a": "#x", "c": "d"}) == "#x b #x d"
+    )
+
+
+def test_formatted_values_float_precision():
+    df = pd.DataFrame({"a": [1.0, 2.0], "b": [3.14159265, 1.23456789e-9]})
+    a, b = javascript._formatted_values(df, float_precision=3)
+    assert a.dtype == np.int64
+    assert b.tolist() == [3.142, 1.23e-9]
+
+    a, b = javascript._formatted_values(df, float_precision=None)
+    assert b.tolist() == [3.14159265, 1.23456789e-9]
+
+
+def test_column_filters_header_is_escaped():
+    df = pd.DataFrame({"<b>a</b>": [1]})
+    html = javascript._datatables_repr_(df, column_filters="header")
+    assert "<th>&lt;b&gt;a&lt;/b&gt;</th>" in html
+
+
+def test_float_precision_is_the_same_on_columns_with_nan():
+    df = pd.DataFrame({"a": [1 / 3, 2 / 3], "b": [1 / 3, np.nan]})
+    a, b = javascript._formatted_values(df, float_precision=2)
+    assert a.tolist() == [0.33, 0.67]
+    assert b[0] == 0.33
+    assert np.isnan(b[1])
+
+
+def test_float_precision_defaults_to_display_precision():
+    df = pd.DataFrame({"a": [1 / 3, 2 / 3]})
+    with pd.option_context("display.precision", 2):
+        html = javascript._datatables_repr_(df)
+    assert "[[0.33,0.67]]" in html.replace(" ", "")
+
+
+def test_shortened_floats_are_not_longer():
+    assert javascript._shortened_floats(np.array([2.5e-30, 0.5]), 6).tolist() == [
+        2.5e-30,
+        0.5,
+    ]
+    x = np.array([1 / 3, 0.5], dtype=np.float32)
+    assert javascript._shortened_floats(x, 3).tolist() == [0.333, 0.5]
+
+
+def test_shortened_floats_use_decimals_like_pandas():
+    x = np.array([0.00010001, 0.0505051, 3.14159265])
+    assert javascript._shortened_floats(x, 6).tolist() == [0.0001, 0.050505, 3.141593]
+
+
+def test_shortened_floats_that_would_round_to_zero():
+    x = np.array([1.23456789e-9, -1.234e-7])
+    assert javascript._shortened_floats(x, 6).tolist() == [1.23457e-9, -1.234e-7]
+    assert javascript._shortened_floats(np.array([0.5, 0.25, 1.5]), 0).tolist() == [
+        0.5,
+        0.2,
+        2.0,
+    ]
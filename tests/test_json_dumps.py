@@ -72,3 +72,17 @@ def test_json_dumps():
 def test_json_dumps_issues_warnings():
     with pytest.warns(UserWarning, match="starts with 'function'"):
         json_dumps("function(x) {return x;}", eval_functions=None)
+
+
+def test_javascript_function_must_start_with_function():
+    with pytest.raises(ValueError, match="start with 'function'"):
+        JavascriptFunction("return x;")
+
+
+def test_json_dumps_deeply_nested_arguments():
+    depth = 10000
+    obj = "function(x) {return x;}"
+    for _ in range(depth):
+        obj = [{"a": obj}]
+    text = json_dumps(obj, eval_functions=True)
+    assert text == '[{"a": ' * depth + "function(x) {return x;}" + "}]" * depth